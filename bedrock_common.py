@@ -0,0 +1,465 @@
+#   Copyright 2024 hidenorly
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os
+import sys
+import codecs
+import json
+import logging
+import mmap
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Optional
+
+try:
+    import orjson
+    json_dumps = orjson.dumps
+    json_loads = orjson.loads
+except ImportError:
+    json_dumps = json.dumps
+    json_loads = json.loads
+
+try:
+    import msgspec
+
+    class _Delta(msgspec.Struct):
+        type: str = ""
+        text: str = ""
+
+    class _Chunk(msgspec.Struct):
+        type: str
+        delta: Optional[_Delta] = None
+
+    # typed decode of the fields needed for text_delta, the rest of the payload is skipped
+    chunk_decoder = msgspec.json.Decoder(_Chunk)
+except ImportError:
+    chunk_decoder = None
+
+# the constant part of the request body, generate_message() adds the per-request fields
+_BODY_TEMPLATE = {
+    "anthropic_version": "bedrock-2023-05-31",
+    "temperature": 1,  # default value is 1
+    "top_p": 0.999,    # default value is 0.999
+}
+
+# keep-alive and a larger pool for reused connections, adaptive retries to back off on throttling
+# and a long read timeout since a streamed response may take minutes to complete.
+# kept as the botocore.config.Config arguments so that botocore is imported only when a client is made
+BEDROCK_CLIENT_CONFIG = dict(
+    retries = {"max_attempts": 5, "mode": "adaptive"},
+    tcp_keepalive = True,
+    max_pool_connections = 64,
+    read_timeout = 600,
+    connect_timeout = 10
+)
+
+@lru_cache(maxsize=4)
+def get_bedrock_runtime(access_key=None, secret_key=None, region=None):
+    """
+    Get the Amazon Bedrock boto3 client, shared across calls with the same credentials.
+    Args:
+        access_key (str) : The AWS access key.
+        secret_key (str) : The AWS secret key.
+        region (str) : The AWS region.
+
+    Returns:
+        The Amazon Bedrock boto3 client.
+    """
+    # importing boto3 is the largest part of the startup time, defer it until a client is needed
+    import boto3
+    from botocore.config import Config
+
+    if access_key and secret_key and region:
+        session = boto3.Session(
+            aws_access_key_id = access_key,
+            aws_secret_access_key = secret_key,
+            region_name = region
+        )
+    else:
+        # Use .aws/credential's default
+        session = boto3.Session()
+
+    return session.client(service_name='bedrock-runtime', config=Config(**BEDROCK_CLIENT_CONFIG))
+
+
+# files larger than this are decoded straight from a mapping instead of being read into a bytes object
+MMAP_THRESHOLD = 1 << 20
+
+def _read_one(path):
+    if os.path.isfile(path):
+        size = os.path.getsize(path)
+        if size:
+            with open(path, 'rb') as f:
+                if size > MMAP_THRESHOLD:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        return str(mm, 'UTF-8')
+                return f.read().decode('UTF-8')
+    return None
+
+
+def files_reader(files, separator=""):
+    if not files:
+        return ""
+
+    with ThreadPoolExecutor(max_workers=min(32, len(files))) as executor:
+        parts = [part for part in executor.map(_read_one, files) if part is not None]
+
+    # join() returns a single part as-is, without copying it
+    return separator.join(parts)
+
+
+def files_contents(files):
+    """
+    Read each file separately, concurrently.
+    Args:
+        files (list) : The file paths.
+
+    Returns:
+        list: The content of each file in the same order as files.
+    """
+    if not files:
+        return []
+
+    with ThreadPoolExecutor(max_workers=min(32, len(files))) as executor:
+        return [content or "" for content in executor.map(_read_one, files)]
+
+
+def generate_message(bedrock_runtime, model_id, system_prompt, messages, max_tokens):
+    """
+    Generate a message response from the Anthropic Bedrock model.
+    Args:
+        bedrock_runtime: The Amazon Bedrock boto3 client.
+        model_id (str): The model ID to use.
+        system_prompt (str) : The system prompt text.
+        messages (JSON) : The messages to send to the model.
+        max_tokens (int) : The maximum  number of tokens to generate.
+
+    Yields:
+        str: The generated message response text as it arrives.
+
+    Returns:
+        dict: The status information of the model response.
+    """
+
+    status = {}
+
+    body = json_dumps(_BODY_TEMPLATE | {
+        "max_tokens": max_tokens,
+        "system": system_prompt,
+        "messages": messages
+    })
+
+    response = bedrock_runtime.invoke_model_with_response_stream(
+        body=body,
+        modelId=model_id)
+
+    for event in response.get("body"):
+        # hand the payload bytes to the decoders as-is: orjson and msgspec parse bytes without
+        # an intermediate str, and a memoryview would not help since `in` on it is not a substring search
+        raw = event["chunk"]["bytes"]
+
+        # skip ping, content_block_start/stop and message_stop without decoding them.
+        # the quoted type tag can't match inside a text value since the quotes are escaped there
+        if b'"content_block_delta"' not in raw and b'"message_delta"' not in raw and b'"message_start"' not in raw:
+            continue
+
+        if chunk_decoder:
+            typed = chunk_decoder.decode(raw)
+            chunk_type = typed.type
+            if chunk_type == 'content_block_delta':
+                delta = typed.delta
+                if delta and delta.type == 'text_delta':
+                    yield delta.text
+                continue
+            if chunk_type != 'message_delta' and chunk_type != 'message_start':
+                continue
+
+        chunk = json_loads(raw)
+        chunk_type = chunk.get('type')
+        delta = chunk.get('delta')
+
+        # content_block_delta is the most frequent event, check it first
+        if chunk_type == 'content_block_delta':
+            if delta['type'] == 'text_delta':
+                yield delta['text']
+        elif chunk_type == 'message_delta':
+            status.update({
+                "stop_reason" : delta['stop_reason'],
+                "stop_sequence" : delta['stop_sequence'],
+                "output_tokens" : chunk['usage']['output_tokens'],
+            })
+        elif chunk_type == 'message_start':
+            status["input_tokens"] = chunk['message']['usage']['input_tokens']
+
+    return status
+
+
+def generate_converse_message(bedrock_runtime, model_id, system_prompt, messages, max_tokens):
+    """
+    Generate a message response with the provider agnostic Bedrock Converse API.
+    Args:
+        Same as generate_message(). messages are converted to the Converse schema,
+        only their text content blocks are sent and any other content block is dropped.
+
+    Yields:
+        str: The generated message response text as it arrives.
+
+    Returns:
+        dict: The status information of the model response.
+    """
+
+    status = {}
+
+    converse_messages = [
+        {
+            "role": message["role"],
+            "content": [{"text": content["text"]} for content in message["content"] if content.get("type") == "text"]
+        } for message in messages
+    ]
+
+    response = bedrock_runtime.converse_stream(
+        modelId=model_id,
+        messages=converse_messages,
+        system=[{"text": system_prompt}] if system_prompt else [],
+        inferenceConfig={
+            "maxTokens": max_tokens,
+            "temperature": _BODY_TEMPLATE["temperature"],
+            "topP": _BODY_TEMPLATE["top_p"]
+        })
+
+    # the events are already parsed by botocore, no decode is needed here
+    for event in response.get("stream"):
+        if "contentBlockDelta" in event:
+            text = event["contentBlockDelta"]["delta"].get("text")
+            if text:
+                yield text
+        elif "messageStop" in event:
+            status.update({
+                "stop_reason" : event["messageStop"]["stopReason"],
+                "stop_sequence" : None,
+            })
+        elif "metadata" in event:
+            usage = event["metadata"]["usage"]
+            status.update({
+                "input_tokens" : usage["inputTokens"],
+                "output_tokens" : usage["outputTokens"],
+            })
+
+    return status
+
+
+def consume_message(stream, on_text):
+    """
+    Pass each text piece of the streamed response to on_text as it arrives.
+    Args:
+        stream: The generator returned by generate_message().
+        on_text: The callable to receive each text piece.
+
+    Returns:
+        dict: The status information of the model response.
+    """
+    try:
+        while True:
+            on_text(next(stream))
+    except StopIteration as e:
+        return e.value
+
+
+def generate_message_text(bedrock_runtime, model_id, system_prompt, messages, max_tokens, generate=generate_message):
+    """
+    Generate the whole message response for callers which need it as one string.
+    Args:
+        Same as generate_message().
+        generate : generate_message or generate_converse_message.
+
+    Returns:
+        str: The generated message response.
+        dict: The status information of the model response.
+    """
+    pieces = []
+    status = consume_message(generate(
+        bedrock_runtime, model_id, system_prompt, messages, max_tokens), pieces.append)
+
+    return ''.join(pieces), status
+
+
+def generate_messages(bedrock_runtime, model_id, system_prompt, messages_list, max_tokens, max_workers=4, generate=generate_message):
+    """
+    Generate the message responses of independent requests concurrently.
+    Args:
+        bedrock_runtime: The Amazon Bedrock boto3 client.
+        model_id (str): The model ID to use.
+        system_prompt (str) : The system prompt text.
+        messages_list (list) : The messages of each request.
+        max_tokens (int) : The maximum  number of tokens to generate.
+        max_workers (int) : The maximum number of requests in flight.
+        generate : generate_message or generate_converse_message.
+
+    Returns:
+        list: The (message response, status) of each request in the same order as messages_list.
+              A failed request gets (None, the raised exception) instead.
+    """
+    if not messages_list:
+        return []
+
+    results = []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(messages_list)))) as executor:
+        futures = [executor.submit(generate_message_text, bedrock_runtime, model_id, system_prompt, messages, max_tokens, generate) for messages in messages_list]
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as err:
+                # keep the responses of the other requests
+                results.append((None, err))
+
+    return results
+
+
+def error_message(err):
+    if hasattr(err, "response"):
+        return err.response["Error"]["Message"]
+    return str(err)
+
+
+def build_messages(user_prompt):
+    user_message = {
+        "role": "user",
+        "content": [
+            {
+                "type": "text",
+                "text": user_prompt
+            }
+        ]
+    }
+    return [user_message]
+
+
+@lru_cache(maxsize=1)
+def _stdout_raw():
+    # the fd of sys.stdout and an encoder with its encoding and errors, to write the encoded bytes directly.
+    # None when sys.stdout has no fd or is a Windows console, which doesn't take encoded bytes
+    try:
+        fd = sys.stdout.fileno()
+    except (AttributeError, OSError, ValueError):
+        return None
+    if os.name == 'nt' and sys.stdout.isatty():
+        return None
+
+    # anything already buffered in sys.stdout has to come first
+    sys.stdout.flush()
+    # incremental, so stateful codecs (BOM, shift sequences) stay correct across the pieces
+    encoder = codecs.getincrementalencoder(sys.stdout.encoding or 'UTF-8')(sys.stdout.errors or 'strict')
+    return fd, encoder.encode
+
+
+def stdout_writer(text):
+    raw = _stdout_raw()
+    if raw is None:
+        sys.stdout.write(text)
+        sys.stdout.flush()
+        return
+
+    # write the encoded bytes to the fd directly, bypassing sys.stdout's text layer and buffer.
+    # os.write() may write partially, so loop until everything is written
+    fd, encode = raw
+    data = memoryview(encode(text))
+    while data:
+        data = data[os.write(fd, data):]
+
+
+def add_bedrock_arguments(parser):
+    parser.add_argument('args', nargs='*', help='files')
+    parser.add_argument('-k', '--accessKey', action='store', default=os.getenv('AWS_ACCESS_KEY_ID'), help='specify your access key or set in .aws/credential or set in AWS_ACCESS_KEY_ID env')
+    parser.add_argument('-s', '--secretKey', action='store', default=os.getenv('AWS_SECRET_ACCESS_KEY'), help='specify your secret key or set it .aws/credential or set in AWS_SECRET_ACCESS_KEY')
+    parser.add_argument('-r', '--region', action='store', default="us-west-2", help='specify region')
+    parser.add_argument('-m', '--model', action='store', default="anthropic.claude-3-sonnet-20240229-v1:0", help='specify model')
+    parser.add_argument('-b', '--batch', action='store_true', default=False, help='specify if each file is requested separately')
+    parser.add_argument('-j', '--jobs', action='store', type=int, default=4, help='specify maximum concurrent requests for --batch')
+    parser.add_argument('-c', '--concatSep', action='store', default="", help='specify separator inserted between the files')
+    parser.add_argument('--converse', action='store_true', default=False, help='specify if the Bedrock Converse API is used instead of InvokeModel')
+    parser.add_argument('-t', '--stats', action='store_true', default=False, help='specify if the usage stats are output to stderr as JSON')
+
+
+def read_inputs(args):
+    """
+    Read the input files, or stdin if no file is specified.
+    Args:
+        args: The arguments parsed with add_bedrock_arguments().
+
+    Returns:
+        list: The file paths requested separately with --batch, otherwise None.
+        list: The input text of each request.
+    """
+    if len(args.args)>0:
+        if args.batch:
+            batch_paths = [path for path in args.args if os.path.isfile(path)]
+            if len(batch_paths)>0:
+                return batch_paths, files_contents(batch_paths)
+        return None, [files_reader(args.args, args.concatSep)]
+
+    return None, [sys.stdin.read()]
+
+
+def run_prompts(args, system_prompt, user_prompts, max_tokens, batch_paths=None):
+    """
+    Send the requests and print the responses, streamed for a single request or per file for --batch.
+    Args:
+        args: The arguments parsed with add_bedrock_arguments().
+        system_prompt (str) : The system prompt text.
+        user_prompts (list) : The user prompt of each request.
+        max_tokens (int) : The maximum  number of tokens to generate.
+        batch_paths (list) : The file paths of each request returned by read_inputs().
+    """
+    logger = logging.getLogger(__name__)
+    status = None
+
+    # botocore is imported only now so that --help and argument errors don't pay for it
+    from botocore.exceptions import ClientError
+
+    try:
+        bedrock_runtime = get_bedrock_runtime(args.accessKey, args.secretKey, args.region)
+
+        if bedrock_runtime:
+            model_id = args.model
+
+            generate = generate_message
+            if args.converse:
+                generate = generate_converse_message
+
+            if batch_paths:
+                results = generate_messages(
+                    bedrock_runtime, model_id, system_prompt, [build_messages(user_prompt) for user_prompt in user_prompts], max_tokens, args.jobs, generate)
+
+                for path, (response_messages, status) in zip(batch_paths, results):
+                    print( "# " + path )
+                    if response_messages is None:
+                        logger.error("A client error occurred: %s: %s", path, error_message(status))
+                        print("A client error occured: " + error_message(status))
+                        continue
+                    print( response_messages )
+                    if args.stats:
+                        print(json.dumps(dict(status, path=path)), file=sys.stderr)
+            else:
+                status = consume_message(generate(
+                    bedrock_runtime, model_id, system_prompt, build_messages(user_prompts[0]), max_tokens), stdout_writer)
+
+                print()
+                if args.stats:
+                    print(json.dumps(status), file=sys.stderr)
+
+    except ClientError as err:
+        message = err.response["Error"]["Message"]
+        logger.error("A client error occurred: %s", message)
+        print("A client error occured: " + format(message))
+        print(str(status))